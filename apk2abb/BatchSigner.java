@@ -0,0 +1,55 @@
+/*
+ * Long-lived AAB signer for batch conversion
+ *
+ * Run with the Java 11+ source launcher:
+ *   java BatchSigner.java <keystore> <storepass> <alias> <keypass> <signer_name>
+ *
+ * Reads one AAB path per line on stdin, signs it in place (same result as
+ * jarsigner with SHA256withRSA / SHA-256) and answers "OK" or "ERR <reason>"
+ * on stdout. Keeps a single JVM and loaded keystore for the whole batch.
+ */
+import java.io.BufferedReader;
+import java.io.File;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.nio.file.Paths;
+import java.nio.file.StandardCopyOption;
+import java.security.KeyStore;
+import java.util.zip.ZipFile;
+
+import jdk.security.jarsigner.JarSigner;
+
+public class BatchSigner {
+    public static void main(String[] args) throws Exception {
+        KeyStore keystore = KeyStore.getInstance(new File(args[0]), args[1].toCharArray());
+        KeyStore.PrivateKeyEntry key = (KeyStore.PrivateKeyEntry) keystore.getEntry(
+            args[2], new KeyStore.PasswordProtection(args[3].toCharArray()));
+
+        JarSigner signer = new JarSigner.Builder(key)
+            .signatureAlgorithm("SHA256withRSA")
+            .digestAlgorithm("SHA-256")
+            .signerName(args[4])
+            .build();
+
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in));
+        String line;
+        while ((line = in.readLine()) != null) {
+            Path aab = Paths.get(line);
+            Path tmp = aab.resolveSibling(aab.getFileName() + ".signing");
+            try {
+                try (ZipFile zip = new ZipFile(aab.toFile());
+                     OutputStream out = Files.newOutputStream(tmp)) {
+                    signer.sign(zip, out);
+                }
+                Files.move(tmp, aab, StandardCopyOption.REPLACE_EXISTING);
+                System.out.println("OK");
+            } catch (Exception e) {
+                Files.deleteIfExists(tmp);
+                System.out.println("ERR " + e);
+            }
+            System.out.flush();
+        }
+    }
+}
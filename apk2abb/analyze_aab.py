@@ -4,10 +4,41 @@ Quick utility to display AAB file information
 """
 import os
 import sys
+import itertools
+import functools
 import zipfile
 from pathlib import Path
 from datetime import datetime
 
+import zip_accel
+
+_READ_BUFFER_SIZE = 1 << 20
+_EOCD_SIGNATURE = b"PK\x05\x06"
+_EOCD_SEARCH_SIZE = (1 << 16) + 22
+
+def _module_of(name):
+    """Top-level path component of an archive entry"""
+    return name.partition('/')[0]
+
+@functools.lru_cache(maxsize=32)
+def _read_central_dir(path, mtime_ns, size):
+    """
+    Read the archive's entry names sorted by (module, name), cached per
+    (path, mtime, size) so a modified file invalidates its cache entry
+    """
+    # 1 MiB read buffer so zipfile's EOCD scan and central directory reads
+    # don't turn into many small reads on slow filesystems
+    with open(path, 'rb', buffering=_READ_BUFFER_SIZE) as f:
+        # Reject non-ZIP files up front: the EOCD record must sit within
+        # the last 64 KiB (max comment length) plus its own 22 bytes
+        f.seek(max(0, size - _EOCD_SEARCH_SIZE))
+        if _EOCD_SIGNATURE not in f.read():
+            raise zipfile.BadZipFile("End of central directory record not found")
+        f.seek(0)
+        
+        with zipfile.ZipFile(f, 'r') as z:
+            return tuple(sorted(z.namelist(), key=lambda n: (_module_of(n), n)))
+
 def analyze_aab(aab_path):
     """Analyze and display AAB file information"""
     aab_path = Path(aab_path)
@@ -32,27 +63,20 @@ def analyze_aab(aab_path):
     
     # Analyze ZIP structure
     try:
-        with zipfile.ZipFile(aab_path, 'r') as z:
-            files = z.namelist()
-            
-            print(f"\n📂 Archive Contents ({len(files)} files):")
-            
-            # Group by module
-            modules = {}
-            for file in files:
-                parts = file.split('/')
-                if len(parts) > 0:
-                    module = parts[0]
-                    if module not in modules:
-                        modules[module] = []
-                    modules[module].append(file)
-            
-            for module in sorted(modules.keys()):
-                print(f"  ├─ {module}/")
-                for file in sorted(modules[module])[:5]:
-                    print(f"  │  ├─ {file}")
-                if len(modules[module]) > 5:
-                    print(f"  │  └─ ... and {len(modules[module]) - 5} more")
+        files = _read_central_dir(str(aab_path.resolve()), stat.st_mtime_ns, stat.st_size)
+        
+        print(f"\n📂 Archive Contents ({len(files)} files):")
+        
+        # Group by module (top-level path component); names are sorted on
+        # (module, name), so each module's entries form one contiguous run
+        # even when plain names sort between them ("base-x/", "base.txt", "base/")
+        for module, group in itertools.groupby(files, key=_module_of):
+            module_files = list(group)
+            print(f"  ├─ {module}/")
+            for file in module_files[:5]:
+                print(f"  │  ├─ {file}")
+            if len(module_files) > 5:
+                print(f"  │  └─ ... and {len(module_files) - 5} more")
         
         print(f"\n✓ AAB file is valid")
         return True
@@ -65,6 +89,7 @@ def analyze_aab(aab_path):
         return False
 
 def main():
+    zip_accel.enable_isal_zlib()
     if len(sys.argv) < 2:
         print("Usage: python analyze_aab.py <path_to_aab>")
         print("\nExample: python analyze_aab.py output/iot-marketplace-app.aab")
@@ -4,12 +4,222 @@ Convert APK to AAB (Android App Bundle) for Play Store
 """
 import os
 import sys
+import atexit
+import functools
+import concurrent.futures
+import multiprocessing
 import subprocess
-import json
+import time
+import hashlib
+import re
+import contextlib
+import queue
+import threading
 from pathlib import Path
-from datetime import datetime
 import zipfile
-import tempfile
+
+from download_bundletool import BUNDLETOOL_VERSION, have_java, java_runs
+import zip_accel
+
+def _pb_len_field(field_number, payload):
+    """Encode a length-delimited protobuf field (payloads here are < 128 bytes)"""
+    return bytes([(field_number << 3) | 2, len(payload)]) + payload
+
+# Minimal BundleConfig protobuf, built once: BundleConfig.bundletool (1) ->
+# Bundletool.version (2). Everything else keeps its default (REGULAR bundle)
+_BUNDLE_CONFIG_BYTES = _pb_len_field(1, _pb_len_field(2, BUNDLETOOL_VERSION.encode()))
+
+BATCH_SIGNER_SRC = Path(__file__).parent / "BatchSigner.java"
+MIN_FAST_SIGNING_JAVA = 17
+SIGN_TIMEOUT = 120  # seconds, per AAB
+
+# Zero-copy APK payload writes via os.sendfile (Linux only)
+_USE_SENDFILE = sys.platform.startswith("linux") and hasattr(os, "sendfile")
+_COPY_CHUNK_SIZE = 1 << 20
+_WRITE_BUFFER_SIZE = 1 << 20
+
+_LOG_FH = None
+
+def _logf(path):
+    """Return the shared line-buffered log handle, opening it on first use"""
+    global _LOG_FH
+    if _LOG_FH is None:
+        _LOG_FH = open(path, "a", buffering=1)
+        atexit.register(_LOG_FH.close)
+    return _LOG_FH
+
+@functools.lru_cache(maxsize=1)
+def _java_major_version():
+    """Parse the major version from java -version, or None if it can't be determined"""
+    try:
+        result = subprocess.run(["java", "-version"], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    match = re.search(r'version "(\d+)(?:\.(\d+))?', result.stderr)
+    if not match:
+        return None
+    major = int(match.group(1))
+    # Java 8 and earlier report as 1.x
+    if major == 1 and match.group(2):
+        major = int(match.group(2))
+    return major
+
+def _write_stored_sendfile(aab_zip, src_path, arcname):
+    """
+    Add src_path to aab_zip as a ZIP_STORED entry, with the payload copied
+    in the kernel by os.sendfile (from the page cache) instead of through
+    Python. The payload is read once in Python beforehand for its CRC32, so
+    the local header is complete when written (no data descriptor) and the
+    entry matches what ZipFile.write produces
+    """
+    zinfo = zipfile.ZipInfo.from_file(src_path, arcname, strict_timestamps=False)
+    zinfo.compress_type = zipfile.ZIP_STORED
+    size = zinfo.compress_size = zinfo.file_size
+    zip64 = size * 1.05 > zipfile.ZIP64_LIMIT
+    fp = aab_zip.fp
+    
+    with open(src_path, 'rb') as src:
+        # Read exactly the size recorded in the header (sendfile copies the
+        # same range), so a file that grows meanwhile can't skew the CRC
+        crc = 0
+        remaining = size
+        while remaining:
+            chunk = src.read(min(_COPY_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise OSError(f"{src_path} shrank while being read")
+            crc = zip_accel.crc32(chunk, crc)
+            remaining -= len(chunk)
+        zinfo.CRC = crc
+        
+        aab_zip._writecheck(zinfo)
+        aab_zip._didModify = True
+        fp.seek(aab_zip.start_dir)
+        zinfo.header_offset = fp.tell()
+        header = zinfo.FileHeader(zip64)
+        fp.write(header)
+        fp.flush()
+        
+        sent = 0
+        while sent < size:
+            n = os.sendfile(fp.fileno(), src.fileno(), sent, size - sent)
+            if n == 0:
+                raise OSError(f"{src_path} shrank while being copied")
+            sent += n
+    # sendfile moved the fd behind the buffered writer's back; resync it
+    fp.seek(zinfo.header_offset + len(header) + size)
+    
+    aab_zip.start_dir = fp.tell()
+    aab_zip.filelist.append(zinfo)
+    aab_zip.NameToInfo[zinfo.filename] = zinfo
+
+def _digest_path(aab_path):
+    return aab_path.with_name(aab_path.name + ".sha256")
+
+def _write_digest(aab_path, digest, aab_stat):
+    """
+    Record an AAB's SHA-256 next to it, in sha256sum format, followed by the
+    size and mtime it was computed for
+    """
+    _digest_path(aab_path).write_text(
+        f"{digest}  {aab_path.name}\n"
+        f"# size={aab_stat.st_size} mtime_ns={aab_stat.st_mtime_ns}\n"
+    )
+
+def _hash_file(path):
+    """SHA-256 of a file, read in 1 MiB chunks"""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_COPY_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def _read_digest(aab_path, aab_stat):
+    """
+    Return the SHA-256 of an AAB, hashing it only when needed
+    The sidecar is trusted only if it was recorded for the AAB's current
+    size and mtime; otherwise the AAB is rehashed and the sidecar rewritten
+    """
+    try:
+        lines = _digest_path(aab_path).read_text().splitlines()
+        digest = lines[0].split()[0]
+        recorded = dict(field.split("=", 1) for field in lines[1].lstrip("#").split())
+        if (int(recorded["size"]) == aab_stat.st_size
+                and int(recorded["mtime_ns"]) == aab_stat.st_mtime_ns):
+            return digest
+    except (OSError, IndexError, KeyError, ValueError):
+        pass
+    
+    digest = _hash_file(aab_path)
+    _write_digest(aab_path, digest, aab_stat)
+    return digest
+
+class _BatchSigner:
+    """
+    Persistent BatchSigner.java process that signs AABs sent over stdin
+    Avoids paying JVM startup and keystore load for every AAB in a batch
+    """
+    def __init__(self, keystore_path, keystore_pass, key_alias, key_pass):
+        # Same signature file name jarsigner derives from the alias
+        signer_name = re.sub(r"[^A-Za-z0-9_-]", "_", key_alias[:8].upper())
+        self.proc = subprocess.Popen(
+            ["java", str(BATCH_SIGNER_SRC), str(keystore_path), keystore_pass, key_alias, key_pass, signer_name],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True
+        )
+        # Replies are read on a separate thread so sign() can time out
+        # instead of blocking forever on a hung JVM
+        self.replies = queue.Queue()
+        threading.Thread(target=self._read_replies, daemon=True).start()
+        # Set once the process is gone; later sign() calls fail fast with it
+        self.dead = None
+    
+    def _read_replies(self):
+        for line in self.proc.stdout:
+            self.replies.put(line.strip())
+        self.replies.put("")  # EOF: the signer exited
+    
+    def sign(self, aab_path, timeout=SIGN_TIMEOUT):
+        """Sign an AAB in place; returns None on success or an error message"""
+        if self.dead:
+            return self.dead
+        
+        try:
+            self.proc.stdin.write(f"{aab_path}\n")
+            self.proc.stdin.flush()
+            reply = self.replies.get(timeout=timeout)
+        except BrokenPipeError:
+            reply = ""
+        except queue.Empty:
+            self.proc.kill()
+            self.proc.wait()
+            # The killed JVM can't clean up its partial output
+            Path(f"{aab_path}.signing").unlink(missing_ok=True)
+            self.dead = f"batch signer timed out after {timeout}s"
+            return self.dead
+        
+        if reply == "OK":
+            return None
+        if reply.startswith("ERR "):
+            return reply[4:]
+        self.dead = "batch signer exited unexpectedly"
+        return self.dead
+    
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        try:
+            self.proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
 
 class APKtoAABConverter:
     def __init__(self):
@@ -31,20 +241,21 @@ class APKtoAABConverter:
         
     def log_message(self, message):
         """Log message to console and file"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
         log_entry = f"[{timestamp}] {message}"
         print(log_entry)
         
-        with open(self.logs_dir / "conversion.log", "a") as f:
-            f.write(log_entry + "\n")
+        _logf(self.logs_dir / "conversion.log").write(log_entry + "\n")
     
-    def check_requirements(self):
-        """Check if all required tools are available"""
+    def check_requirements(self, verify_java=False):
+        """
+        Check if all required tools are available
+        verify_java: also start the JVM to confirm it actually runs
+        """
         self.log_message("🔍 Checking requirements...")
         
         # Check Java
-        ret = os.system("java -version > /dev/null 2>&1")
-        if ret != 0:
+        if not have_java() or (verify_java and not java_runs()):
             self.log_message("✗ Java is NOT installed")
             return False
         self.log_message("✓ Java is installed")
@@ -63,6 +274,15 @@ class APKtoAABConverter:
         
         return True
     
+    def check_signing_jvm(self):
+        """
+        Warn if the JVM predates JDK 17, whose SHA-256 MessageDigest uses the
+        CPU's SHA extensions; older JDKs hash every AAB entry in software
+        """
+        version = _java_major_version()
+        if version is not None and version < MIN_FAST_SIGNING_JAVA:
+            self.log_message(f"⚠ Java {version} detected; JDK {MIN_FAST_SIGNING_JAVA}+ signs much faster (hardware SHA-256)")
+    
     def convert_apk_to_aab(self, apk_path, output_aab_path):
         """
         Convert APK to AAB using bundletool
@@ -80,71 +300,58 @@ class APKtoAABConverter:
         self.log_message(f"  Input: {apk_path}")
         self.log_message(f"  Output: {output_aab_path}")
         
-        # Create temporary directory for work
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tmpdir = Path(tmpdir)
-            
-            # Step 1: Convert APK to module format (rename to .zip for processing)
-            self.log_message(f"  [1/3] Preparing APK module...")
-            
-            # Create temporary zip file
-            temp_zip = tmpdir / "universal.apks.zip"
-            temp_module_dir = tmpdir / "base"
-            temp_module_dir.mkdir()
-            
-            # Copy APK as base module
-            import shutil
-            shutil.copy(apk_path, temp_module_dir / "universal.apk")
-            
-            # Create a minimal BundleConfig
-            bundle_config = {
-                "version": 1,
-                "modules": [
-                    {
-                        "name": "base",
-                        "enabled": True,
-                        "type": "ASSET_PACK"
-                    }
-                ]
-            }
-            
-            # Write bundle config
-            config_file = temp_module_dir / "BundleConfig.pb"
-            with open(config_file, 'w') as f:
-                f.write(str(bundle_config))
-            
-            self.log_message(f"  ✓ Module prepared")
+        # Step 1: Prepare module contents
+        # (BundleConfig.pb is static and pre-encoded at import time)
+        self.log_message(f"  [1/3] Preparing APK module...")
+        self.log_message(f"  ✓ Module prepared")
+        
+        # Step 2: Build AAB from prepared modules
+        self.log_message(f"  [2/3] Building AAB...")
+        _digest_path(output_aab_path).unlink(missing_ok=True)
+        
+        # Use Python's zipfile to create AAB, streaming the APK straight
+        # into the archive instead of staging a copy in a temp directory.
+        # The output must stay seekable so zipfile writes complete local
+        # headers (java.util.zip.ZipInputStream rejects STORED entries with
+        # a data descriptor)
+        try:
+            # 1 MiB write buffer so zipfile's small writes are coalesced
+            with open(output_aab_path, 'wb', buffering=_WRITE_BUFFER_SIZE) as raw, \
+                    zipfile.ZipFile(raw, 'w', allowZip64=True, strict_timestamps=False) as aab_zip:
+                # Add the APK as base module (stored: APK contents are already compressed)
+                if _USE_SENDFILE:
+                    _write_stored_sendfile(aab_zip, apk_path, "base/universal.apk")
+                else:
+                    aab_zip.write(apk_path, arcname="base/universal.apk", compress_type=zipfile.ZIP_STORED)
+                # Add BundleConfig
+                aab_zip.writestr(
+                    zipfile.ZipInfo("BundleConfig.pb"),
+                    _BUNDLE_CONFIG_BYTES,
+                    compress_type=zipfile.ZIP_DEFLATED,
+                    compresslevel=zip_accel.deflate_level()
+                )
             
-            # Step 2: Build AAB from prepared modules
-            self.log_message(f"  [2/3] Building AAB...")
+            self.log_message(f"  ✓ AAB structure created")
             
-            # Use Python's zipfile to create AAB
-            try:
-                with zipfile.ZipFile(output_aab_path, 'w', zipfile.ZIP_DEFLATED) as aab_zip:
-                    # Add the APK as base module
-                    aab_zip.write(temp_module_dir / "universal.apk", arcname="base/universal.apk")
-                    # Add BundleConfig
-                    aab_zip.write(config_file, arcname="BundleConfig.pb")
-                
-                self.log_message(f"  ✓ AAB structure created")
-                
-            except Exception as e:
-                self.log_message(f"✗ AAB creation failed: {e}")
-                return False
+        except Exception as e:
+            self.log_message(f"✗ AAB creation failed: {e}")
+            return False
         
         # Verify output
-        if not output_aab_path.exists():
+        try:
+            file_size = output_aab_path.stat().st_size / (1024 * 1024)  # MB
+        except FileNotFoundError:
             self.log_message(f"✗ AAB file was not created")
             return False
         
-        file_size = output_aab_path.stat().st_size / (1024 * 1024)  # MB
         self.log_message(f"  ✓ AAB created successfully ({file_size:.2f} MB)")
         
         return True
     
-    def sign_aab(self, aab_path):
+    def sign_aab(self, aab_path, signer=None):
         """
         Sign the AAB file with keystore
+        signer: optional _BatchSigner to reuse one JVM across many AABs
         """
         aab_path = Path(aab_path)
         signed_aab_path = aab_path.parent / aab_path.name.replace(".aab", "-signed.aab")
@@ -153,6 +360,19 @@ class APKtoAABConverter:
         self.log_message(f"  Input: {aab_path}")
         self.log_message(f"  Output: {signed_aab_path}")
         
+        # Signing rewrites the AAB in place, so the recorded digest is stale;
+        # get_bundle_info rehashes on demand
+        _digest_path(aab_path).unlink(missing_ok=True)
+        
+        if signer is not None:
+            error = signer.sign(aab_path)
+            if error:
+                self.log_message(f"✗ Signing failed: {error}")
+                return False
+            
+            self.log_message(f"  ✓ AAB signed successfully")
+            return str(signed_aab_path)
+        
         # Use jarsigner to sign the AAB
         sign_cmd = [
             "jarsigner",
@@ -167,7 +387,7 @@ class APKtoAABConverter:
         ]
         
         try:
-            result = subprocess.run(sign_cmd, capture_output=True, text=True, timeout=120)
+            result = subprocess.run(sign_cmd, capture_output=True, text=True, timeout=SIGN_TIMEOUT)
             if result.returncode != 0:
                 self.log_message(f"✗ Signing failed: {result.stderr}")
                 return False
@@ -179,17 +399,26 @@ class APKtoAABConverter:
             self.log_message(f"✗ Signing failed: {e}")
             return False
     
-    def get_bundle_info(self, aab_path):
+    def get_bundle_info(self, aab_path, dump_manifest=False):
         """
         Get information about the AAB file
+        SHA-256 is cached in a .sha256 sidecar and only recomputed when the AAB changes
+        dump_manifest: also dump the manifest via bundletool (starts a JVM)
         """
         aab_path = Path(aab_path)
         
-        if not aab_path.exists():
+        try:
+            aab_stat = aab_path.stat()
+        except FileNotFoundError:
             self.log_message(f"✗ AAB file not found: {aab_path}")
             return False
         
         self.log_message(f"📋 AAB Information:")
+        self.log_message(f"  Size: {aab_stat.st_size / (1024 * 1024):.2f} MB")
+        self.log_message(f"  SHA-256: {_read_digest(aab_path, aab_stat)}")
+        
+        if not dump_manifest:
+            return True
         
         info_cmd = [
             "java", "-jar", str(self.bundletool_jar),
@@ -208,22 +437,19 @@ class APKtoAABConverter:
             self.log_message(f"✗ Failed to get info: {e}")
             return False
     
-    def process_apk(self, apk_path, sign=True):
+    def output_path_for(self, apk_path):
+        """Default output AAB path for an APK"""
+        return self.output_dir / (Path(apk_path).stem.replace(" ", "_") + ".aab")
+    
+    def build_aab(self, apk_path, sign=True, output_aab=None):
         """
-        Main conversion process
+        Convert a single APK to AAB and sign it if requested
+        Returns the output AAB path, or False if conversion failed
         """
         apk_path = Path(apk_path)
         
-        self.log_message("=" * 60)
-        self.log_message(f"APK to AAB Conversion")
-        self.log_message("=" * 60)
-        
-        # Check requirements
-        if not self.check_requirements():
-            return False
-        
         # Generate output filename
-        output_aab = self.output_dir / (apk_path.stem.replace(" ", "_") + ".aab")
+        output_aab = Path(output_aab) if output_aab else self.output_path_for(apk_path)
         
         # Convert APK to AAB
         if not self.convert_apk_to_aab(apk_path, output_aab):
@@ -234,8 +460,31 @@ class APKtoAABConverter:
             if not self.sign_aab(output_aab):
                 self.log_message("⚠ AAB created but signing failed")
         
+        return output_aab
+    
+    def process_apk(self, apk_path, sign=True, dump_manifest=False):
+        """
+        Main conversion process
+        """
+        apk_path = Path(apk_path)
+        
+        self.log_message("=" * 60)
+        self.log_message(f"APK to AAB Conversion")
+        self.log_message("=" * 60)
+        
+        # Check requirements
+        if not self.check_requirements():
+            return False
+        if sign:
+            self.check_signing_jvm()
+        
+        # Convert (and optionally sign)
+        output_aab = self.build_aab(apk_path, sign=sign)
+        if not output_aab:
+            return False
+        
         # Get bundle info
-        self.get_bundle_info(output_aab)
+        self.get_bundle_info(output_aab, dump_manifest=dump_manifest)
         
         self.log_message("=" * 60)
         self.log_message(f"✓ Conversion completed!")
@@ -244,18 +493,103 @@ class APKtoAABConverter:
         
         return True
 
+    def batch_signer(self):
+        """Start a _BatchSigner for this converter's keystore"""
+        return _BatchSigner(self.keystore_path, self.keystore_pass, self.key_alias, self.key_pass)
+    
+    def process_batch(self, apk_paths, sign=True, max_workers=None):
+        """
+        Convert several APKs in parallel, one worker process per APK
+        Finished AABs are signed here as they complete, through a single
+        long-lived signer JVM, while other workers are still packing
+        """
+        apk_paths = [Path(p) for p in apk_paths]
+        
+        self.log_message("=" * 60)
+        self.log_message(f"APK to AAB Batch Conversion ({len(apk_paths)} APKs)")
+        self.log_message("=" * 60)
+        
+        # Check requirements once for the whole batch
+        if not self.check_requirements():
+            return False
+        if sign:
+            self.check_signing_jvm()
+        
+        # APKs with the same file name (from different directories) would
+        # otherwise be written to the same output AAB concurrently
+        output_paths = []
+        used = set()
+        for apk_path in apk_paths:
+            output_aab = self.output_path_for(apk_path)
+            n = 2
+            while output_aab in used:
+                output_aab = output_aab.with_name(f"{self.output_path_for(apk_path).stem}_{n}.aab")
+                n += 1
+            if output_aab != self.output_path_for(apk_path):
+                self.log_message(f"⚠ Output name for {apk_path} already taken, using {output_aab.name}")
+            used.add(output_aab)
+            output_paths.append(output_aab)
+        
+        results = [False] * len(apk_paths)
+        # Spawn (not fork) workers so they don't inherit the signer's stdin pipe,
+        # which would keep it from seeing EOF when the batch is done
+        pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers or os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        signer_ctx = self.batch_signer() if sign else contextlib.nullcontext()
+        with pool as ex, signer_ctx as signer:
+            futures = {
+                ex.submit(_build_one, apk_path, output_aab, False): i
+                for i, (apk_path, output_aab) in enumerate(zip(apk_paths, output_paths))
+            }
+            for future in concurrent.futures.as_completed(futures):
+                i = futures[future]
+                try:
+                    output_aab = future.result()
+                except Exception as e:
+                    self.log_message(f"✗ Conversion of {apk_paths[i]} failed: {e!r}")
+                    continue
+                if output_aab and sign:
+                    if not self.sign_aab(output_aab, signer=signer):
+                        self.log_message("⚠ AAB created but signing failed")
+                results[i] = output_aab
+        
+        self.log_message("=" * 60)
+        for apk_path, output_aab in zip(apk_paths, results):
+            if output_aab:
+                self.log_message(f"✓ {apk_path} -> {output_aab}")
+            else:
+                self.log_message(f"✗ {apk_path} failed")
+        self.log_message("=" * 60)
+        
+        return all(results)
+
+def _build_one(apk_path, output_aab, sign):
+    """Worker entry point for process_batch; each process keeps its own converter"""
+    zip_accel.enable_isal_zlib()
+    return APKtoAABConverter().build_aab(apk_path, sign=sign, output_aab=output_aab)
+
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python apk_to_aab.py <path_to_apk> [--no-sign]")
+    zip_accel.enable_isal_zlib()
+    apk_files = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    
+    if not apk_files:
+        print("Usage: python apk_to_aab.py <path_to_apk> [<path_to_apk> ...] [--no-sign] [--dump-manifest]")
         print("\nExample: python apk_to_aab.py ../iot-marketplace-app.apk")
         sys.exit(1)
     
-    apk_file = sys.argv[1]
     sign = "--no-sign" not in sys.argv
+    dump_manifest = "--dump-manifest" in sys.argv
     
     converter = APKtoAABConverter()
     
-    if not converter.process_apk(apk_file, sign=sign):
+    if len(apk_files) > 1:
+        ok = converter.process_batch(apk_files, sign=sign)
+    else:
+        ok = converter.process_apk(apk_files[0], sign=sign, dump_manifest=dump_manifest)
+    
+    if not ok:
         sys.exit(1)
 
 if __name__ == "__main__":
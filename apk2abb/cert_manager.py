@@ -4,22 +4,32 @@ Certificate and keystore management for APK/AAB signing
 """
 import os
 import sys
+import atexit
 import subprocess
+import time
 from pathlib import Path
-from datetime import datetime
 
 CERTS_DIR = Path(__file__).parent / "certs"
 LOG_DIR = Path(__file__).parent / "logs"
 
+_LOG_FH = None
+
+def _logf(path):
+    """Return the shared line-buffered log handle, opening it on first use"""
+    global _LOG_FH
+    if _LOG_FH is None:
+        path.parent.mkdir(exist_ok=True)
+        _LOG_FH = open(path, "a", buffering=1)
+        atexit.register(_LOG_FH.close)
+    return _LOG_FH
+
 def log_message(message):
     """Log message to console and file"""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
     log_entry = f"[{timestamp}] {message}"
     print(log_entry)
     
-    LOG_DIR.mkdir(exist_ok=True)
-    with open(LOG_DIR / "cert.log", "a") as f:
-        f.write(log_entry + "\n")
+    _logf(LOG_DIR / "cert.log").write(log_entry + "\n")
 
 def create_keystore(keystore_path, keystore_pass, alias, alias_pass, validity_days=25550):
     """
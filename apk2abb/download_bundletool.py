@@ -4,56 +4,201 @@ Download and setup bundletool for APK to AAB conversion
 """
 import os
 import sys
+import atexit
+import shutil
+import functools
+import subprocess
+import time
+from subprocess import DEVNULL
+import hashlib
+import urllib.error
 import urllib.request
 import zipfile
 from pathlib import Path
-from datetime import datetime
 
 BUNDLETOOL_VERSION = "1.15.6"
 BUNDLETOOL_URL = f"https://github.com/google/bundletool/releases/download/{BUNDLETOOL_VERSION}/bundletool-all-{BUNDLETOOL_VERSION}.jar"
 TOOLS_DIR = Path(__file__).parent / "tools"
 BUNDLETOOL_JAR = TOOLS_DIR / "bundletool.jar"
 LOG_DIR = Path(__file__).parent / "logs"
+# SHA-256 of the release jar. Downloads are only installed once this is
+# pinned to Google's published digest for BUNDLETOOL_VERSION (or when
+# --trust-unpinned is passed); the digest of each download is logged
+BUNDLETOOL_SHA256 = None
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+PROGRESS_INTERVAL = 0.1  # seconds between progress updates (~10 Hz)
+
+@functools.lru_cache(maxsize=1)
+def have_java():
+    """Check for java on PATH without starting a JVM"""
+    return shutil.which("java") is not None
+
+def java_runs():
+    """Run java -version directly (no intermediate shell) to confirm the JVM starts"""
+    return subprocess.run(["java", "-version"], stdout=DEVNULL, stderr=DEVNULL).returncode == 0
+
+class _ProgressWriter:
+    """File wrapper that hashes written data and reports progress, throttled to PROGRESS_INTERVAL"""
+    def __init__(self, f, total_size, sha256, downloaded=0):
+        self.f = f
+        self.total_size = total_size
+        self.sha256 = sha256
+        self.downloaded = downloaded
+        self.last_report = 0.0
+    
+    def write(self, data):
+        self.sha256.update(data)
+        self.downloaded += len(data)
+        now = time.monotonic()
+        if now - self.last_report >= PROGRESS_INTERVAL or self.downloaded == self.total_size:
+            self.last_report = now
+            if self.total_size:
+                percent = min(100, int((self.downloaded / self.total_size) * 100))
+                print(f"\r  Progress: {percent}%", end="", flush=True)
+            else:
+                print(f"\r  Downloaded: {self.downloaded / (1024 * 1024):.1f} MB", end="", flush=True)
+        return self.f.write(data)
+
+_LOG_FH = None
+
+def _logf(path):
+    """Return the shared line-buffered log handle, opening it on first use"""
+    global _LOG_FH
+    if _LOG_FH is None:
+        path.parent.mkdir(exist_ok=True)
+        _LOG_FH = open(path, "a", buffering=1)
+        atexit.register(_LOG_FH.close)
+    return _LOG_FH
 
 def log_message(message):
     """Log message to console and file"""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
     log_entry = f"[{timestamp}] {message}"
     print(log_entry)
     
-    LOG_DIR.mkdir(exist_ok=True)
-    with open(LOG_DIR / "setup.log", "a") as f:
-        f.write(log_entry + "\n")
+    _logf(LOG_DIR / "setup.log").write(log_entry + "\n")
+
+def _sha256_of(path):
+    """Hash an existing file, returning a sha256 object that can keep being updated"""
+    with open(path, "rb") as f:
+        if hasattr(hashlib, "file_digest"):  # Python 3.11+
+            return hashlib.file_digest(f, "sha256")
+        sha256 = hashlib.sha256()
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+        return sha256
+
+def _is_valid_jar(path):
+    """Check that path is a readable ZIP whose entries all pass their CRC"""
+    try:
+        with zipfile.ZipFile(path) as z:
+            return z.testzip() is None
+    except (zipfile.BadZipFile, OSError):
+        return False
+
+def _install_part(part_file, digest, trust_unpinned=False):
+    """
+    Verify a complete download and move it into place as BUNDLETOOL_JAR
+    A corrupt or mismatching download is discarded; an unpinned but valid
+    one is kept as .part (so a rerun doesn't download it again) unless
+    trust_unpinned is set
+    """
+    if BUNDLETOOL_SHA256 and digest != BUNDLETOOL_SHA256:
+        part_file.unlink()
+        log_message(f"✗ Bundletool checksum mismatch: expected {BUNDLETOOL_SHA256}, got {digest}")
+        return False
+    
+    # Structural check (every entry's header and CRC): catches truncated
+    # or mis-resumed downloads and error pages even when no digest is pinned
+    if not _is_valid_jar(part_file):
+        part_file.unlink()
+        log_message("✗ Downloaded bundletool is not a valid jar, discarded")
+        return False
+    
+    if not BUNDLETOOL_SHA256:
+        if not trust_unpinned:
+            log_message("✗ BUNDLETOOL_SHA256 is not pinned, refusing to install an unverified jar")
+            log_message(f"  Downloaded SHA-256: {digest}")
+            log_message(f"  Compare it with the published digest for bundletool {BUNDLETOOL_VERSION}, then set")
+            log_message(f"  BUNDLETOOL_SHA256 or rerun with --trust-unpinned (download kept at {part_file})")
+            return False
+        log_message("⚠ BUNDLETOOL_SHA256 is not pinned; installing on --trust-unpinned (jar structure verified only)")
+    
+    os.replace(part_file, BUNDLETOOL_JAR)
+    log_message(f"✓ Downloaded bundletool to {BUNDLETOOL_JAR}")
+    log_message(f"  SHA-256: {digest}")
+    return True
 
-def download_bundletool():
-    """Download bundletool jar file"""
+def download_bundletool(trust_unpinned=False):
+    """
+    Download bundletool jar file
+    Downloads to a .part file (resumed via HTTP Range if one is left over)
+    and only moves it into place once complete and verified
+    trust_unpinned: install even though BUNDLETOOL_SHA256 is not set
+    """
     TOOLS_DIR.mkdir(exist_ok=True)
     
     if BUNDLETOOL_JAR.exists():
         log_message(f"✓ Bundletool already exists at {BUNDLETOOL_JAR}")
         return True
     
-    log_message(f"📥 Downloading bundletool {BUNDLETOOL_VERSION}...")
+    # Versioned so a leftover from a different release is never resumed
+    part_file = TOOLS_DIR / f"bundletool-{BUNDLETOOL_VERSION}.jar.part"
+    resume_from = part_file.stat().st_size if part_file.exists() else 0
+    
+    if resume_from:
+        log_message(f"📥 Resuming bundletool {BUNDLETOOL_VERSION} download from {resume_from} bytes...")
+    else:
+        log_message(f"📥 Downloading bundletool {BUNDLETOOL_VERSION}...")
     
     try:
-        def progress_hook(block_num, block_size, total_size):
-            downloaded = block_num * block_size
-            percent = min(100, int((downloaded / total_size) * 100))
-            print(f"\r  Progress: {percent}%", end="", flush=True)
+        headers = {"Accept-Encoding": "identity"}
+        if resume_from:
+            headers["Range"] = f"bytes={resume_from}-"
+        req = urllib.request.Request(BUNDLETOOL_URL, headers=headers)
         
-        urllib.request.urlretrieve(BUNDLETOOL_URL, BUNDLETOOL_JAR, progress_hook)
+        with urllib.request.urlopen(req) as r:
+            # Server ignored the Range header and is sending the whole file
+            if resume_from and r.status != 206:
+                resume_from = 0
+            
+            sha256 = _sha256_of(part_file) if resume_from else hashlib.sha256()
+            total_size = int(r.headers.get("Content-Length") or 0)
+            if total_size:
+                total_size += resume_from
+            
+            with open(part_file, "ab" if resume_from else "wb") as f:
+                writer = _ProgressWriter(f, total_size, sha256, downloaded=resume_from)
+                shutil.copyfileobj(r, writer, length=DOWNLOAD_CHUNK_SIZE)
         print()  # New line after progress
-        log_message(f"✓ Downloaded bundletool to {BUNDLETOOL_JAR}")
-        return True
         
+        return _install_part(part_file, sha256.hexdigest(), trust_unpinned)
+        
+    except urllib.error.HTTPError as e:
+        if e.code == 416 and resume_from:
+            # Range starts at or past the end of the jar. If the .part is
+            # exactly the full size (Content-Range: bytes */<size>), or the
+            # size is unknown but it is a complete jar, it just needs verifying
+            total = (e.headers.get("Content-Range") or "").rpartition("/")[2]
+            if (int(total) == resume_from) if total.isdigit() else _is_valid_jar(part_file):
+                log_message("✓ Partial download is already complete, verifying")
+                return _install_part(part_file, _sha256_of(part_file).hexdigest(), trust_unpinned)
+            # Leftover .part is not a valid prefix of the jar; start over
+            part_file.unlink()
+            log_message("⚠ Partial download could not be resumed, restarting")
+            return download_bundletool(trust_unpinned)
+        log_message(f"✗ Failed to download bundletool: {e}")
+        return False
     except Exception as e:
         log_message(f"✗ Failed to download bundletool: {e}")
         return False
 
-def check_java():
-    """Check if Java is installed"""
-    ret = os.system("java -version > /dev/null 2>&1")
-    if ret == 0:
+def check_java(verify=False):
+    """
+    Check if Java is installed
+    verify: also start the JVM to confirm it actually runs
+    """
+    if have_java() and (not verify or java_runs()):
         log_message("✓ Java is installed")
         return True
     else:
@@ -66,11 +211,11 @@ def main():
     log_message("=" * 60)
     
     # Check Java
-    if not check_java():
+    if not check_java(verify=True):
         sys.exit(1)
     
     # Download bundletool
-    if not download_bundletool():
+    if not download_bundletool(trust_unpinned="--trust-unpinned" in sys.argv[1:]):
         sys.exit(1)
     
     log_message("=" * 60)
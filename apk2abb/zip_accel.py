@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Optional ISA-L (SIMD-accelerated zlib) support for zipfile
+Nothing is patched on import; scripts opt in from their entry point
+"""
+import zlib
+import zipfile
+
+try:
+    from isal import isal_zlib
+except ImportError:
+    isal_zlib = None
+
+# zlib-compatible CRC32 for code that computes ZIP CRCs itself
+crc32 = isal_zlib.crc32 if isal_zlib else zlib.crc32
+
+def enable_isal_zlib():
+    """
+    Route zipfile's deflate/inflate and CRC32 through ISA-L, if installed
+    This affects zipfile for the whole process, so only call it from a
+    script's entry point. Returns True if ISA-L is now in use
+    """
+    if isal_zlib is None:
+        return False
+
+    zipfile.zlib = isal_zlib
+    # zipfile binds crc32 at import time, so it has to be swapped separately
+    zipfile.crc32 = isal_zlib.crc32
+    return True
+
+def deflate_level():
+    """
+    Default compresslevel for the zlib zipfile is currently using
+    (ISA-L only accepts levels 0-3)
+    """
+    if isal_zlib is not None and zipfile.zlib is isal_zlib:
+        return isal_zlib.ISAL_DEFAULT_COMPRESSION
+    return 6